@@ -0,0 +1,211 @@
+# _scoring_numba.py
+
+"""
+Numba 加速的打分内核。
+
+对 (A,) int16 属性和向量执行适应度计算，供优化器的热路径
+（穷举/局部搜索）调用。numba 未安装时退化为纯 Python 实现，
+结果一致，只是速度回到解释器水平。
+"""
+
+import numpy as np
+
+from module_types import ATTR_THRESHOLDS
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba 未安装时退化为纯 Python
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+
+        def wrap(func):
+            return func
+        return wrap
+
+
+# 属性和 → 阈值等级(0..6) 的查找表，以及按等级索引的适应度档位表。
+# 打分内核里用 LUT 取代逐属性的阈值比较链。
+MAX_SUM = 255
+LEVEL_LUT = np.searchsorted(
+    np.asarray(ATTR_THRESHOLDS, dtype=np.int16),
+    np.arange(MAX_SUM + 1), side='right'
+).astype(np.int8)
+# 等级 4/5/6 对应 12/16/20 档：base + (v - offset) * slope
+TIER_BASE = np.array([0.0, 0.0, 0.0, 0.0, 100.0, 500.0, 1000.0])
+TIER_SLOPE = np.array([0.0, 0.0, 0.0, 0.0, 5.0, 15.0, 20.0])
+TIER_OFFSET = np.array([0.0, 0.0, 0.0, 0.0, 12.0, 16.0, 20.0])
+
+
+@njit(cache=True, fastmath=True, nogil=True, inline='always')
+def score_from_sums(sums, has_prioritized, prioritized_mask,
+                    target_mask, physical_mask, magic_mask):
+    """按属性和向量计算适应度，与 module_optimizer.calculate_fitness 的打分一致。
+
+    Args:
+        sums: (A,) int16，4 个模组的各属性数值之和
+        has_prioritized: 是否启用了用户优先属性筛选
+        prioritized_mask / target_mask / physical_mask / magic_mask:
+            (A,) bool，按规范属性 id 展开的集合掩码
+    """
+    score = 0.0
+    threshold_score = 0.0
+    target_score = 0.0
+    physical_sum = 0.0
+    magic_sum = 0.0
+    total = 0.0
+    match_count = 0
+    mismatch_count = 0
+    for a in range(sums.shape[0]):
+        vi = sums[a]
+        v = np.float64(vi)
+        total += v
+        if vi > 0:
+            if prioritized_mask[a]:
+                match_count += 1
+            else:
+                mismatch_count += 1
+            level = LEVEL_LUT[vi if vi < MAX_SUM else MAX_SUM]
+            threshold_score += TIER_BASE[level] + (v - TIER_OFFSET[level]) * TIER_SLOPE[level]
+            if target_mask[a]:
+                target_score += v * 5.0
+            if physical_mask[a]:
+                physical_sum += v
+            if magic_mask[a]:
+                magic_sum += v
+    if has_prioritized:
+        score += match_count * 100.0 - mismatch_count * 50.0
+    score += threshold_score + target_score
+    if physical_sum > 0 and magic_sum > 0:
+        score -= min(physical_sum, magic_sum) * 10.0
+    score += total * 0.1
+    return score if score > 0.0 else 0.0
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def score_batch(sums_matrix, has_prioritized, prioritized_mask,
+                target_mask, physical_mask, magic_mask):
+    """对 (N, A) 的属性和矩阵逐行打分，返回 (N,) 得分向量。
+
+    一个槽位换遍整个候选池的场景用一次调用完成，省掉 N 次
+    Python 层的内核调用开销。
+    """
+    out = np.empty(sums_matrix.shape[0], dtype=np.float64)
+    for r in range(sums_matrix.shape[0]):
+        out[r] = score_from_sums(sums_matrix[r], has_prioritized, prioritized_mask,
+                                 target_mask, physical_mask, magic_mask)
+    return out
+
+
+@njit(cache=True, fastmath=True, nogil=True, inline='always')
+def _optimistic_score(partial_sums, remaining_max, slots, has_prioritized,
+                      prioritized_mask, target_mask):
+    """已选模组属性和 + 剩余槽位全部取上界时的乐观得分。
+
+    只累加随属性值单调不减的项（优先匹配、阈值档位、目标属性、总值），
+    不计错配和物理/法术冲突扣分，因此是真实得分的有效上界。
+    """
+    ub = 0.0
+    for a in range(partial_sums.shape[0]):
+        vi = np.int64(partial_sums[a]) + slots * np.int64(remaining_max[a])
+        if vi > 0:
+            v = np.float64(vi)
+            if has_prioritized and prioritized_mask[a]:
+                ub += 100.0
+            level = LEVEL_LUT[vi if vi < MAX_SUM else MAX_SUM]
+            ub += TIER_BASE[level] + (v - TIER_OFFSET[level]) * TIER_SLOPE[level]
+            if target_mask[a]:
+                ub += v * 5.0
+            ub += v * 0.1
+    return ub
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def enumerate_top_quads(matrix, suffix_max, top_n, has_prioritized, prioritized_mask,
+                        target_mask, physical_mask, magic_mask):
+    """穷举全部 C(N,4) 组合并返回得分最高的 top_n 个。
+
+    组合大小固定为 4，循环按 i<j<k<l 手工展开并携带前缀部分和，
+    最内层每个组合只剩一次向量加；打分辅助函数以 inline 方式并入
+    本内核，消除调用边界后 LLVM 可对属性维度做 SIMD 向量化。
+    维护一个固定大小的最差位替换缓冲区代替堆。
+    suffix_max[k] 是第 k 行之后所有模组的按属性最大值，固定前缀后
+    据此对剩余槽位做分支限界剪枝，低于当前 top_n 门槛的子树整体跳过。
+
+    Returns:
+        (scores, quads): (top_n,) float64 与 (top_n, 4) int64，未排序
+    """
+    n = matrix.shape[0]
+    a_dim = matrix.shape[1]
+    best_scores = np.full(top_n, -1.0, dtype=np.float64)
+    best_quads = np.zeros((top_n, 4), dtype=np.int64)
+    count = 0
+    worst = 0
+    sums2 = np.zeros(a_dim, dtype=np.int16)
+    sums3 = np.zeros(a_dim, dtype=np.int16)
+    sums = np.zeros(a_dim, dtype=np.int16)
+    for i in range(n - 3):
+        for j in range(i + 1, n - 2):
+            for a in range(a_dim):
+                sums2[a] = matrix[i, a] + matrix[j, a]
+            if count == top_n:
+                ub = _optimistic_score(sums2, suffix_max[j + 1], 2, has_prioritized,
+                                       prioritized_mask, target_mask)
+                if ub <= best_scores[worst]:
+                    continue
+            for k in range(j + 1, n - 1):
+                for a in range(a_dim):
+                    sums3[a] = sums2[a] + matrix[k, a]
+                if count == top_n:
+                    ub = _optimistic_score(sums3, suffix_max[k + 1], 1, has_prioritized,
+                                           prioritized_mask, target_mask)
+                    if ub <= best_scores[worst]:
+                        continue
+                for l in range(k + 1, n):
+                    for a in range(a_dim):
+                        sums[a] = sums3[a] + matrix[l, a]
+                    s = score_from_sums(sums, has_prioritized, prioritized_mask,
+                                        target_mask, physical_mask, magic_mask)
+                    if count < top_n:
+                        best_scores[count] = s
+                        best_quads[count, 0] = i
+                        best_quads[count, 1] = j
+                        best_quads[count, 2] = k
+                        best_quads[count, 3] = l
+                        count += 1
+                        if count == top_n:
+                            worst = np.argmin(best_scores)
+                    elif s > best_scores[worst]:
+                        best_scores[worst] = s
+                        best_quads[worst, 0] = i
+                        best_quads[worst, 1] = j
+                        best_quads[worst, 2] = k
+                        best_quads[worst, 3] = l
+                        worst = np.argmin(best_scores)
+    return best_scores[:count], best_quads[:count]
+
+
+def build_suffix_max(matrix):
+    """构建 (N+1, A) 后缀最大值表，suffix_max[k] 为第 k 行及之后各属性的最大值。"""
+    n = matrix.shape[0]
+    suffix_max = np.zeros((n + 1, matrix.shape[1]), dtype=np.int16)
+    for k in range(n - 1, -1, -1):
+        np.maximum(matrix[k], suffix_max[k + 1], out=suffix_max[k])
+    return suffix_max
+
+
+def _warmup():
+    """导入时用哑元数据触发 JIT 编译，把编译延迟挪到启动阶段。"""
+    zeros = np.zeros(1, dtype=np.int16)
+    false_mask = np.zeros(1, dtype=np.bool_)
+    score_from_sums(zeros, False, false_mask, false_mask, false_mask, false_mask)
+    dummy = np.zeros((4, 1), dtype=np.int16)
+    score_batch(dummy, False, false_mask, false_mask, false_mask, false_mask)
+    enumerate_top_quads(dummy, build_suffix_max(dummy), 1, False,
+                        false_mask, false_mask, false_mask, false_mask)
+
+
+_warmup()
@@ -2,37 +2,91 @@
 
 import tkinter
 import customtkinter as ctk
+import concurrent.futures
+import functools
 import threading
-from typing import Optional, Dict, List
+from typing import ClassVar, Optional, Dict, List, Tuple
 import queue
 import logging
-import sys
+import logging.handlers
 
 from network_interface_util import get_network_interfaces
 from star_resonance_monitor_core import StarResonanceMonitor
 from logging_config import setup_logging
 
-# --- 日志队列处理器 (不变) ---
-class QueueHandler(logging.Handler):
-    def __init__(self, log_queue):
+# --- 日志转发处理器 ---
+# 流水线：原始 LogRecord → QueueListener 线程格式化 → GUI 侧 SimpleQueue。
+# 格式化（时间戳、异常堆栈渲染等）全部在监听线程完成，
+# Tk 主线程只做文本插入，抓包/监控线程只负责入队原始记录。
+class QueueForwardingHandler(logging.Handler):
+    def __init__(self, log_queue, notify=None):
         super().__init__()
         self.log_queue = log_queue
+        self.notify = notify
 
     def emit(self, record):
-        self.log_queue.put(self.format(record))
+        self.log_queue.put(self.format(record) + "\n")
+        if self.notify:
+            self.notify()
 
-# --- 标准输出流重定向到队列 (不变) ---
+# --- 标准输出流重定向到队列 ---
+# 核心代码已统一改用 logging，不再重定向 sys.stdout；
+# 保留此类以便需要时捕获第三方库的 print 输出。
 class StreamToQueue:
-    def __init__(self, text_queue):
+    def __init__(self, text_queue, notify=None):
         self.text_queue = text_queue
+        self.notify = notify
+        self._buf = ""
 
     def write(self, text):
-        self.text_queue.put(text)
+        # 行缓冲：print 会分别 write 正文和 "\n"，凑满整行再入队，
+        # 把每次 print 的两次队列投递合并成一次
+        self._buf += text
+        i = self._buf.rfind("\n")
+        if i >= 0:
+            self.text_queue.put(self._buf[:i + 1])
+            self._buf = self._buf[i + 1:]
+            if self.notify:
+                self.notify()
 
     def flush(self):
-        pass
+        if self._buf:
+            self.text_queue.put(self._buf)
+            self._buf = ""
+            if self.notify:
+                self.notify()
+
+# 日志文本框保留的最大行数，超出后从头部裁剪，保证长时间抓包下内存和重绘开销有界
+MAX_LOG_LINES = 5000
+
+# 接口枚举可能较慢（Windows 上尤其明显），缓存结果避免重复打开窗口时再次枚举
+@functools.lru_cache(maxsize=1)
+def _cached_interfaces():
+    return get_network_interfaces()
 
 class App(ctk.CTk):
+    # 预设筛选属性表在所有实例间共享；表只有十几项且只在点选时查一次，
+    # 用 (名称, 属性串) 元组对线性扫描即可，省掉中文字符串的哈希开销
+    PRESETS: ClassVar[Tuple[Tuple[str, str], ...]] = (
+        ("手动输入 / 清空", ""),
+        ("神盾骑士", "抵御魔法 抵御物理 暴击专注"),
+        ("雷影剑士", "敏捷加持 特攻伤害 精英打击 暴击专注"),
+        ("冰魔导师", "智力加持 特攻伤害 精英打击 施法专注 暴击专注 幸运专注"),
+        ("青岚骑士", "力量加持 特攻伤害 精英打击 攻速专注"),
+        ("森语者", "智力加持 特攻治疗加持 专精治疗加持 幸运专注"),
+        ("巨刃守护者", "力量加持 抵御魔法 抵御物理 暴击专注 幸运专注"),
+        ("神射手", "敏捷加持 特攻伤害 精英打击 攻速专注"),
+        ("灵魂乐手", "智力加持 特攻治疗加持 专精治疗加持 攻速专注 幸运专注"),
+        ("全部", "极-伤害叠加 极-灵活身法 极-生命凝聚 极-急救措施 极-生命波动 极-生命汲取 极-全队幸暴 极-绝境守护 力量加持 敏捷加持 智力加持 特攻伤害 精英打击 特攻治疗加持 专精治疗加持 施法专注 攻速专注 暴击专注 幸运专注 抵御魔法 抵御物理"),
+        ("输出职业", "力量加持 敏捷加持 智力加持 特攻伤害 精英打击 施法专注 攻速专注 暴击专注 幸运专注"),
+        ("防御辅助", "力量加持 敏捷加持 智力加持 特攻治疗加持 专精治疗加持 施法专注 攻速专注 暴击专注 幸运专注 抵御魔法 抵御物理"),
+    )
+    _PRESET_KEYS: ClassVar[Tuple[str, ...]] = tuple(k for k, _ in PRESETS)
+    # 预先按空格拆分好的属性集合，避免下游反复 split/线性扫描
+    _PRESET_SETS: ClassVar[Tuple[Tuple[str, frozenset], ...]] = tuple(
+        (k, frozenset(v.split())) for k, v in PRESETS
+    )
+
     def __init__(self):
         super().__init__()
 
@@ -42,10 +96,16 @@ class App(ctk.CTk):
 
         self.monitor_thread: Optional[threading.Thread] = None
         self.monitor_instance: Optional[StarResonanceMonitor] = None
-        self.interfaces = get_network_interfaces()
-        self.interface_map = {f"{i}: {iface.get('description', iface['name'])}": iface['name'] 
-                              for i, iface in enumerate(self.interfaces)}
-        
+        # 复用同一个工作线程执行重新筛选，避免每次点击都新建线程，
+        # max_workers=1 同时保证两次筛选不会并发争用监控器状态
+        self._rescreen_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="rescreen"
+        )
+        # 接口枚举（Windows 上可能耗时数百毫秒）放到后台线程，窗口先显示占位符
+        self.interfaces: List[Dict] = []
+        self.interface_map: Dict[str, str] = {}
+
+
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(1, weight=1) # 日志文本框行
 
@@ -55,8 +115,9 @@ class App(ctk.CTk):
 
         self.label_interface = ctk.CTkLabel(self.main_frame, text="选择网络接口:")
         self.label_interface.grid(row=0, column=0, padx=10, pady=5, sticky="w")
-        self.interface_menu = ctk.CTkOptionMenu(self.main_frame, values=list(self.interface_map.keys()))
+        self.interface_menu = ctk.CTkOptionMenu(self.main_frame, values=["加载中…"], state="disabled")
         self.interface_menu.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
+        threading.Thread(target=self._load_interfaces, daemon=True).start()
 
         self.label_category = ctk.CTkLabel(self.main_frame, text="选择模组类型:")
         self.label_category.grid(row=1, column=0, padx=10, pady=5, sticky="w")
@@ -73,28 +134,15 @@ class App(ctk.CTk):
 
         self.label_presets = ctk.CTkLabel(self.main_frame, text="选择预设筛选属性:")
         self.label_presets.grid(row=4, column=0, padx=10, pady=5, sticky="w")
-        
-        self.attribute_presets: Dict[str, str] = {
-            "手动输入 / 清空": "",
-            "神盾骑士": "抵御魔法 抵御物理 暴击专注",
-            "雷影剑士": "敏捷加持 特攻伤害 精英打击 暴击专注",
-            "冰魔导师": "智力加持 特攻伤害 精英打击 施法专注 暴击专注 幸运专注",
-            "青岚骑士": "力量加持 特攻伤害 精英打击 攻速专注",
-            "森语者": "智力加持 特攻治疗加持 专精治疗加持 幸运专注",
-            "巨刃守护者": "力量加持 抵御魔法 抵御物理 暴击专注 幸运专注",
-            "神射手": "敏捷加持 特攻伤害 精英打击 攻速专注",
-            "灵魂乐手": "智力加持 特攻治疗加持 专精治疗加持 攻速专注 幸运专注",
-            "全部": "极-伤害叠加 极-灵活身法 极-生命凝聚 极-急救措施 极-生命波动 极-生命汲取 极-全队幸暴 极-绝境守护 力量加持 敏捷加持 智力加持 特攻伤害 精英打击 特攻治疗加持 专精治疗加持 施法专注 攻速专注 暴击专注 幸运专注 抵御魔法 抵御物理",
-            "输出职业": "力量加持 敏捷加持 智力加持 特攻伤害 精英打击 施法专注 攻速专注 暴击专注 幸运专注",
-            "防御辅助": "力量加持 敏捷加持 智力加持 特攻治疗加持 专精治疗加持 施法专注 攻速专注 暴击专注 幸运专注 抵御魔法 抵御物理",
-        }
 
         self.preset_menu = ctk.CTkOptionMenu(
-            self.main_frame, values=list(self.attribute_presets.keys()),
+            self.main_frame, values=self._PRESET_KEYS,
             command=self.update_attributes_from_preset
         )
         self.preset_menu.grid(row=4, column=1, padx=10, pady=5, sticky="ew")
         self.preset_menu.set("手动输入 / 清空")
+        self._last_preset_string = ""
+        self._last_preset_set = frozenset()
 
         self.control_frame = ctk.CTkFrame(self.main_frame)
         self.control_frame.grid(row=5, column=0, columnspan=2, pady=10)
@@ -120,9 +168,12 @@ class App(ctk.CTk):
         # 2. 在创建 CtkTextbox 时应用字体和行间距
         #    - font=log_font 应用上面定义的字体
         #    - spacing3=8 在每行下方增加 8 像素的间距 (您可以按需调整)
-        self.log_textbox = ctk.CTkTextbox(self, state="disabled", wrap="word", font=log_font, spacing3=4)
+        self.log_textbox = ctk.CTkTextbox(self, wrap="word", font=log_font, spacing3=4)
         # --- 修改结束 ---
         self.log_textbox.grid(row=1, column=0, padx=10, pady=(0, 5), sticky="nsew")
+        # 保持 state="normal" 以省去每次刷新时两次跨 Python→Tcl 的 configure 调用，
+        # 通过拦截按键阻止用户编辑；Ctrl+C/Ctrl+A 放行，保留键盘复制/全选
+        self.log_textbox.bind("<Key>", self._block_log_edit)
  
 
         # --- 新增状态栏 ---
@@ -131,72 +182,155 @@ class App(ctk.CTk):
         self.status_label = ctk.CTkLabel(self.status_frame, text="状态: 空闲", anchor="w")
         self.status_label.pack(side="left", padx=10, pady=2)
 
-        self.log_queue = queue.Queue()
+        # SimpleQueue 为 C 实现、无 task_done/join 语义，单次入队/出队开销更低
+        self.log_queue = queue.SimpleQueue()
+        self._log_formatter = logging.Formatter(
+            '[%(asctime)s] [%(levelname)s] %(message)s', datefmt='%H:%M:%S'
+        )
+        # 日志记录先以原始 LogRecord 入队，由 QueueListener 线程格式化后转发，
+        # 避免在抓包等热路径线程上执行字符串格式化
+        self._log_record_queue = queue.SimpleQueue()
         logger_instance = logging.getLogger()
         logger_instance.setLevel(logging.INFO)
-        logger_instance.addHandler(QueueHandler(self.log_queue))
-        sys.stdout = StreamToQueue(self.log_queue)
+        logger_instance.addHandler(logging.handlers.QueueHandler(self._log_record_queue))
+        forwarding_handler = QueueForwardingHandler(self.log_queue, self._notify_log_arrived)
+        forwarding_handler.setFormatter(self._log_formatter)
+        self._log_listener = logging.handlers.QueueListener(
+            self._log_record_queue, forwarding_handler
+        )
+        self._log_listener.start()
 
         # --- 新增进度更新队列 ---
-        self.progress_queue = queue.Queue()
-        self.after(100, self.poll_queues)
+        self.progress_queue = queue.SimpleQueue()
+        # 事件驱动：生产者入队后通过虚拟事件唤醒 UI，空闲时不再周期性轮询；
+        # 另保留一个低频兜底轮询，防止极端情况下事件丢失导致队列积压
+        self._poll_scheduled = False
+        self.bind("<<LogArrived>>", lambda _event: self._schedule_drain())
+        self.after(500, self._poll_backstop)
+
+    def _block_log_edit(self, event):
+        """拦截日志框的编辑按键，但放行 Ctrl+C/Ctrl+A（复制/全选）。"""
+        if (event.state & 0x4) and event.keysym.lower() in ("c", "a"):
+            return None
+        return "break"
+
+    def _notify_log_arrived(self):
+        """线程安全地唤醒 UI 去处理队列（event_generate 在 CPython Tk 中可跨线程调用）。"""
+        try:
+            self.event_generate("<<LogArrived>>", when="tail")
+        except tkinter.TclError:
+            pass  # 窗口已销毁
+
+    def _schedule_drain(self):
+        """把一批 <<LogArrived>> 事件合并成一次 after_idle 的队列处理。"""
+        if not self._poll_scheduled:
+            self._poll_scheduled = True
+            self.after_idle(self._drain)
+
+    def _drain(self):
+        self._poll_scheduled = False
+        self.poll_queues()
+
+    def _poll_backstop(self):
+        self.poll_queues()
+        self.after(500, self._poll_backstop)
+
+    def _load_interfaces(self):
+        """后台线程：枚举网络接口后交回 UI 线程填充下拉菜单。"""
+        interfaces = _cached_interfaces()
+        self.after(0, self._populate_interface_menu, interfaces)
+
+    def _populate_interface_menu(self, interfaces: List[Dict]):
+        self.interfaces = interfaces
+        self.interface_map = {f"{i}: {iface.get('description', iface['name'])}": iface['name']
+                              for i, iface in enumerate(interfaces)}
+        if self.interface_map:
+            values = tuple(self.interface_map)
+            self.interface_menu.configure(values=values, state="normal")
+            self.interface_menu.set(values[0])
+        else:
+            self.interface_menu.configure(values=["未找到可用网络接口"])
 
     def update_attributes_from_preset(self, selection: str):
-        preset_string = self.attribute_presets.get(selection, "")
+        preset_string = next((v for k, v in self.PRESETS if k == selection), "")
+        self._last_preset_string = preset_string
+        self._last_preset_set = next(
+            (s for k, s in self._PRESET_SETS if k == selection), frozenset()
+        )
         self.attributes_entry.delete(0, "end")
         self.attributes_entry.insert(0, preset_string)
 
+    def _attributes_from_entry(self) -> frozenset:
+        """读取输入框中的筛选属性；内容未被用户改动时复用预设的既有拆分结果。"""
+        attributes_str = self.attributes_entry.get().strip()
+        if not attributes_str:
+            return frozenset()
+        if attributes_str == self._last_preset_string:
+            return self._last_preset_set
+        return frozenset(attributes_str.split())
+
     def poll_queues(self):
         # 合并处理两个队列
-        # 处理日志队列
-        while True:
-            try:
-                record = self.log_queue.get(block=False)
-                self.log_textbox.configure(state="normal")
-                self.log_textbox.insert("end", record)
-                self.log_textbox.see("end")
-                self.log_textbox.configure(state="disabled")
-            except queue.Empty:
-                break
-        
-        # 处理进度队列
-        while True:
-            try:
-                message = self.progress_queue.get(block=False)
-                self.status_label.configure(text=f"状态: {message}")
-            except queue.Empty:
-                break
-                
-        self.after(100, self.poll_queues)
+        # 处理日志队列：先把队列一次性排空，再对文本框做单次更新，
+        # 避免每条日志都触发 configure/insert/see 导致的重绘开销
+        # 以 qsize 为界限批量取出：空队列（事件驱动下的常态）不再靠抛
+        # queue.Empty 退出循环，省去每个 tick 的异常开销
+        records = []
+        try:
+            for _ in range(self.log_queue.qsize()):
+                records.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        if records:
+            text = "".join(records)
+            self.log_textbox.insert("end", text)
+            # 裁剪头部超出的旧日志，避免文本框无限增长
+            line_count = int(self.log_textbox.index("end-1c").split(".")[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_textbox.delete("1.0", f"{line_count - MAX_LOG_LINES}.0")
+            self.log_textbox.see("end")
+
+        # 处理进度队列：只保留最后一条消息
+        last_message = None
+        try:
+            for _ in range(self.progress_queue.qsize()):
+                last_message = self.progress_queue.get_nowait()
+        except queue.Empty:
+            pass
+        if last_message is not None:
+            self.status_label.configure(text=f"状态: {last_message}")
 
     def progress_callback(self, message: str):
         """线程安全地将进度消息放入队列。"""
         self.progress_queue.put(message)
+        self._notify_log_arrived()
 
     def start_monitoring(self):
         selected_interface_display = self.interface_menu.get()
-        if not selected_interface_display:
+        interface_name = self.interface_map.get(selected_interface_display)
+        if not interface_name:
             logging.error("错误：请先选择一个网络接口！")
             return
-        
-        interface_name = self.interface_map[selected_interface_display]
         category = self.category_menu.get()
-        attributes_str = self.attributes_entry.get().strip()
-        attributes = attributes_str.split() if attributes_str else []
+        # 在 GUI 边界就转成 frozenset，下游的成员判断从 O(n) 变 O(1)
+        attributes = self._attributes_from_entry()
 
-        self.log_textbox.configure(state="normal")
         self.log_textbox.delete("1.0", "end")
-        self.log_textbox.configure(state="disabled")
         self.status_label.configure(text="状态: 正在启动监控...")
 
-        self.monitor_instance = StarResonanceMonitor(
-            interface_name=interface_name,
-            category=category,
-            attributes=attributes,
-            on_data_captured_callback=self.enable_rescreening,
-            progress_callback=self.progress_callback # 传递回调函数
-        )
-        
+        # 接口没变时复用既有监控器（避免重新初始化抓包组件），只更新筛选条件
+        if self.monitor_instance and self.monitor_instance.interface_name == interface_name:
+            self.monitor_instance.reconfigure(category, attributes)
+        else:
+            self.monitor_instance = StarResonanceMonitor(
+                interface_name=interface_name,
+                category=category,
+                attributes=attributes,
+                on_data_captured_callback=self.enable_rescreening,
+                progress_callback=self.progress_callback # 传递回调函数
+            )
+
+
         self.monitor_thread = threading.Thread(target=self.monitor_instance.start_monitoring, daemon=True)
         self.monitor_thread.start()
 
@@ -213,9 +347,21 @@ class App(ctk.CTk):
         if self.monitor_instance:
             self.monitor_instance.stop_monitoring()
         if self.monitor_thread and self.monitor_thread.is_alive():
-            self.monitor_thread.join(timeout=1.0)
+            # 不在 UI 线程上 join，而是用 after 短间隔轮询线程退出，避免界面卡顿
+            self.stop_button.configure(state="disabled")
+            self.status_label.configure(text="状态: 正在停止监控...")
+            self.after(50, self._await_thread_stop)
+            return
+        self._finalize_stop()
 
-        self.monitor_instance = None
+    def _await_thread_stop(self):
+        if self.monitor_thread and self.monitor_thread.is_alive():
+            self.after(50, self._await_thread_stop)
+            return
+        self._finalize_stop()
+
+    def _finalize_stop(self):
+        # monitor_instance 保留下来供下次在同一接口上快速重启
         self.monitor_thread = None
 
         self.start_button.configure(state="normal")
@@ -231,17 +377,21 @@ class App(ctk.CTk):
             return
         
         category = self.category_menu.get()
-        attributes_str = self.attributes_entry.get().strip()
-        attributes = attributes_str.split() if attributes_str else []
-        
+        attributes = self._attributes_from_entry()
+
         logging.info("=== 用户请求使用新的筛选条件进行重新筛选... ===")
-        
-        threading.Thread(
-            target=self.monitor_instance.rescreen_modules,
-            args=(category, attributes),
-            daemon=True
-        ).start()
-    
+
+        self.rescreen_button.configure(state="disabled")
+        future = self._rescreen_pool.submit(
+            self.monitor_instance.rescreen_modules, category, attributes
+        )
+        future.add_done_callback(lambda _f: self.after(0, self._rescreen_done))
+
+    def _rescreen_done(self):
+        """筛选任务结束后在 UI 线程上恢复按钮状态。"""
+        if self.monitor_instance and self.monitor_instance.has_captured_data():
+            self.rescreen_button.configure(state="normal")
+
     def enable_rescreening(self):
         """回调函数，用于启用“重新筛选”按钮"""
         self.rescreen_button.configure(state="normal")
@@ -249,6 +399,8 @@ class App(ctk.CTk):
         
     def on_closing(self):
         self.stop_monitoring()
+        self._rescreen_pool.shutdown(wait=False, cancel_futures=True)
+        self._log_listener.stop()
         self.destroy()
 
 if __name__ == "__main__":
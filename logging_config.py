@@ -2,8 +2,11 @@
 日志配置
 """
 
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 from datetime import datetime
 
 
@@ -48,11 +51,17 @@ def setup_logging(level=logging.INFO, debug_mode=False):
     file_handler.setLevel(level)
     file_handler.setFormatter(formatter)
     
-    # 配置根日志器
+    # 根日志器只挂 QueueHandler：抓包/解析线程的日志调用仅入队即返回，
+    # 控制台与文件 I/O 由 QueueListener 的后台线程统一完成
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
     root_logger = logging.getLogger()
     root_logger.setLevel(level)
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(file_handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
     
     # 记录日志配置信息
     logger = logging.getLogger(__name__)
@@ -1,19 +1,23 @@
 # module_optimizer.py
 
-import logging
 import os
-import random
 import math
+import itertools
+from collections import deque
 from typing import Dict, List, Optional, Tuple, Callable
-from dataclasses import dataclass, field
-from copy import deepcopy
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
 
+import numpy as np
+
+from _scoring_numba import (score_from_sums, score_batch, enumerate_top_quads,
+                            build_suffix_max, LEVEL_LUT, MAX_SUM, NUMBA_AVAILABLE)
 from logging_config import get_logger
 from module_types import (
-    ModuleInfo, ModuleType, ModuleAttrType, ModuleCategory,
-    MODULE_CATEGORY_MAP, ATTR_THRESHOLDS, BASIC_ATTR_POWER_MAP, SPECIAL_ATTR_POWER_MAP,
-    TOTAL_ATTR_POWER_MAP, BASIC_ATTR_IDS, SPECIAL_ATTR_IDS, ATTR_NAME_TYPE_MAP
+    ModuleInfo, ModuleCategory,
+    MODULE_CATEGORY_MAP, MODULE_ATTR_NAMES, ATTR_THRESHOLDS, BASIC_ATTR_POWER_MAP,
+    SPECIAL_ATTR_POWER_MAP, TOTAL_ATTR_POWER_MAP, ATTR_NAME_TYPE_MAP
 )
 
 # 获取日志记录器
@@ -26,12 +30,86 @@ ATTACK_ATTRIBUTES = {"特攻伤害", "精英打击", "力量加持", "敏捷加
 GUARDIAN_ATTRIBUTES = {"抵御魔法", "抵御物理"}
 SUPPORT_ATTRIBUTES = {"特攻治疗加持", "专精治疗加持"}
 
+# --- SoA 属性矩阵 ---
+# 规范属性顺序：属性名 ↔ 连续整数 id，矩阵按列对应属性、按行对应模组。
+# 热路径上对属性求和/查阈值都走连续的 int16 数组，不再逐条查字典。
+ATTR_NAMES: Tuple[str, ...] = tuple(ATTR_NAME_TYPE_MAP)
+ATTR_IDS: Dict[str, int] = {name: i for i, name in enumerate(ATTR_NAMES)}
+NUM_ATTRS = len(ATTR_NAMES)
+ATTR_THRESHOLDS_ARR = np.asarray(ATTR_THRESHOLDS, dtype=np.int16)
+# 按等级(0..6)索引的词条战力表，以及各属性是否为特殊词条的掩码
+BASIC_POWER_LUT = np.array([BASIC_ATTR_POWER_MAP.get(level, 0) for level in range(len(ATTR_THRESHOLDS) + 1)])
+SPECIAL_POWER_LUT = np.array([SPECIAL_ATTR_POWER_MAP.get(level, 0) for level in range(len(ATTR_THRESHOLDS) + 1)])
+SPECIAL_ATTR_MASK = np.array([ATTR_NAME_TYPE_MAP.get(name, "basic") == 'special' for name in ATTR_NAMES])
+# 等级去重键的位移表：每个属性等级占 3 位（0~6），21 个属性合计 63 位
+_LEVEL_KEY_SHIFTS = np.arange(NUM_ATTRS, dtype=np.uint64) * 3
+# 词条整数 id -> 矩阵列号。部件自带协议 id，建矩阵时整数哈希比中文名哈希便宜
+ATTR_COL_BY_ID: Dict[int, int] = {
+    attr_id: ATTR_IDS[attr_name]
+    for attr_id, attr_name in MODULE_ATTR_NAMES.items() if attr_name in ATTR_IDS
+}
+
+
+def build_attr_matrix(modules: List[ModuleInfo]) -> np.ndarray:
+    """把模组列表转成 (N, A) int16 属性矩阵，第 i 行是第 i 个模组的各属性数值。"""
+    matrix = np.zeros((len(modules), NUM_ATTRS), dtype=np.int16)
+    for i, module in enumerate(modules):
+        row = matrix[i]
+        for part in module.parts:
+            col = ATTR_COL_BY_ID.get(part.id)
+            if col is None:
+                col = ATTR_IDS.get(part.name)  # 兜底：id 未收录时按名称匹配
+            if col is not None:
+                row[col] += part.value
+    return matrix
+
+
+def _attr_mask(attr_names) -> np.ndarray:
+    """把属性名集合展开成按规范属性 id 索引的 (A,) bool 掩码。"""
+    mask = np.zeros(NUM_ATTRS, dtype=np.bool_)
+    for name in attr_names:
+        attr_id = ATTR_IDS.get(name)
+        if attr_id is not None:
+            mask[attr_id] = True
+    return mask
+
+
+PHYSICAL_MASK = _attr_mask(PHYSICAL_ATTRIBUTES)
+MAGIC_MASK = _attr_mask(MAGIC_ATTRIBUTES)
+EMPTY_MASK = np.zeros(NUM_ATTRS, dtype=np.bool_)
+CATEGORY_MASKS = {
+    ModuleCategory.ATTACK: _attr_mask(ATTACK_ATTRIBUTES),
+    ModuleCategory.GUARDIAN: _attr_mask(GUARDIAN_ATTRIBUTES),
+    ModuleCategory.SUPPORT: _attr_mask(SUPPORT_ATTRIBUTES),
+    ModuleCategory.All: EMPTY_MASK,
+}
+# 类型 -> 目标属性名集合，与 CATEGORY_MASKS 对应的字符串版本
+TARGET_ATTRS_BY_CATEGORY = {
+    ModuleCategory.ATTACK: frozenset(ATTACK_ATTRIBUTES),
+    ModuleCategory.GUARDIAN: frozenset(GUARDIAN_ATTRIBUTES),
+    ModuleCategory.SUPPORT: frozenset(SUPPORT_ATTRIBUTES),
+}
+
+
+def fitness_from_sums(sums: np.ndarray, category: ModuleCategory,
+                      prioritized_attrs=None) -> float:
+    """基于 SoA 属性和向量的适应度计算，结果与 calculate_fitness 一致。"""
+    if prioritized_attrs:
+        has_prioritized = True
+        prioritized_mask = _attr_mask(prioritized_attrs)
+    else:
+        has_prioritized = False
+        prioritized_mask = EMPTY_MASK
+    return score_from_sums(sums, has_prioritized, prioritized_mask,
+                           CATEGORY_MASKS[category], PHYSICAL_MASK, MAGIC_MASK)
+
 # --- 解决方案的数据类 (不变) ---
 @dataclass
 class ModuleSolution:
     """代表一个模组搭配的解决方案。"""
     modules: List[ModuleInfo]
-    attr_breakdown: Dict[str, int] = field(default_factory=dict)
+    # 按规范属性 id 排列的 (A,) 属性和向量，展示时再转成属性名字典
+    attr_sums: Optional[np.ndarray] = None
     score: float = 0.0  # 最终战斗力
     optimization_score: float = 0.0 # 优化过程中使用的适应度分数
 
@@ -41,6 +119,13 @@ class ModuleSolution:
     def get_combination_id(self) -> Tuple[str, ...]:
         return tuple(m.uuid for m in self.modules)
 
+    @property
+    def attr_breakdown(self) -> Dict[str, int]:
+        """属性名 -> 数值 的展示用字典。"""
+        if self.attr_sums is None:
+            return {}
+        return {ATTR_NAMES[a]: int(self.attr_sums[a]) for a in np.flatnonzero(self.attr_sums)}
+
 # --- 顶层函数，用于并行执行 ---
 # 这些函数定义在顶层，以便能被多进程模块 "pickle" 序列化。
 
@@ -69,10 +154,7 @@ def calculate_fitness(modules: List[ModuleInfo], category: ModuleCategory,
         elif value >= 12: threshold_score += 100 + (value - 12) * 5
     score += threshold_score
 
-    target_attrs = set()
-    if category == ModuleCategory.ATTACK: target_attrs = ATTACK_ATTRIBUTES
-    elif category == ModuleCategory.GUARDIAN: target_attrs = GUARDIAN_ATTRIBUTES
-    elif category == ModuleCategory.SUPPORT: target_attrs = SUPPORT_ATTRIBUTES
+    target_attrs = TARGET_ATTRS_BY_CATEGORY.get(category, frozenset())
     score += sum(value * 5 for attr_name, value in attr_breakdown.items() if attr_name in target_attrs)
 
     physical_sum = sum(v for k, v in attr_breakdown.items() if k in PHYSICAL_ATTRIBUTES)
@@ -83,105 +165,194 @@ def calculate_fitness(modules: List[ModuleInfo], category: ModuleCategory,
     score += sum(attr_breakdown.values()) * 0.1
     return max(0.0, score)
 
-def run_single_ga_campaign(
-    modules: List[ModuleInfo],
+def _ga_campaign_core(
+    matrix: np.ndarray,
     category: ModuleCategory,
     prioritized_attrs: Optional[List[str]],
-    ga_params: Dict
-) -> List[ModuleSolution]:
+    ga_params: Dict,
+    seed=None
+) -> List[Tuple[Tuple[int, int, int, int], float]]:
     """
-    执行一次完整的遗传算法流程。这是单个进程工作单元的目标函数。
+    在属性矩阵上执行一次完整的遗传算法流程，返回 (下标组合, 适应度) 列表。
+
+    只依赖矩阵而不触碰 ModuleInfo 对象，因此可以跑在共享内存映射上，
+    跨进程时无需序列化模组池。seed 接受 SeedSequence 子种子，
+    各并行任务由此获得互不重叠且可复现的随机流。
     """
+    rng = np.random.default_rng(seed)
+
+    n = matrix.shape[0]
+    target_mask = CATEGORY_MASKS[category]
+    if prioritized_attrs:
+        has_prioritized, prioritized_mask = True, _attr_mask(prioritized_attrs)
+    else:
+        has_prioritized, prioritized_mask = False, EMPTY_MASK
+
+    # 组合总数不超过种群规模时，初始种群本来就能覆盖整个搜索空间，
+    # 跑 GA 纯属浪费：直接穷举所有组合批量打分，结果是确定性全局最优
+    total_combinations = n * (n - 1) * (n - 2) * (n - 3) // 24 if n >= 4 else 0
+    if total_combinations <= ga_params['population_size']:
+        if total_combinations == 0:
+            return []
+        combos = list(itertools.combinations(range(n), 4))
+        combo_sums = matrix[np.asarray(combos, dtype=np.int64)].sum(axis=1, dtype=np.int16)
+        scores = score_batch(combo_sums, has_prioritized, prioritized_mask,
+                             target_mask, PHYSICAL_MASK, MAGIC_MASK)
+        order = np.argsort(-scores)
+        return [(combos[i], float(scores[i])) for i in order]
+
+    # 个体就是排好序的 4 元下标元组：不可变、可哈希、复制零开销，
+    # 精英保留和交叉都不再需要 deepcopy 整棵 ModuleInfo 对象树。
+    # 组合 -> 适应度的缓存让每个不同组合只评估一次（精英跨代自然命中）
+    fitness_cache: Dict[Tuple[int, int, int, int], float] = {}
+
+    def _fit(combo):
+        cached = fitness_cache.get(combo)
+        if cached is None:
+            sums = matrix[list(combo)].sum(axis=0, dtype=np.int16)
+            cached = score_from_sums(sums, has_prioritized, prioritized_mask,
+                                     target_mask, PHYSICAL_MASK, MAGIC_MASK)
+            fitness_cache[combo] = cached
+        return cached
+
     # 辅助函数嵌套在这里，不需要被序列化
-    def _initialize_population(pool, size):
+    def _initialize_population(size):
         population, seen = [], set()
-        if len(pool) < 4: return []
-        try:
-            max_possible_combinations = math.comb(len(pool), 4)
-        except AttributeError:
-            def combinations(n, k):
-                if k < 0 or k > n: return 0
-                if k == 0 or k == n: return 1
-                if k > n // 2: k = n - k
-                res = 1
-                for i in range(k):
-                    res = res * (n - i) // (i + 1)
-                return res
-            max_possible_combinations = combinations(len(pool), 4)
+        if n < 4: return []
+        # k=4 的组合数直接用闭式表达式，省掉 math.comb 调用
+        max_possible_combinations = n * (n - 1) * (n - 2) * (n - 3) // 24
         target_size = min(size, max_possible_combinations)
         if target_size == 0: return []
+        # 用下标位集作为去重签名：单个整数的哈希比排序元组便宜得多
         while len(population) < target_size:
-            selected_modules = random.sample(pool, 4)
-            solution = ModuleSolution(modules=selected_modules)
-            combo_id = solution.get_combination_id()
-            if combo_id not in seen:
-                solution.optimization_score = calculate_fitness(solution.modules, category, prioritized_attrs)
-                population.append(solution)
-                seen.add(combo_id)
+            picked = [int(i) for i in rng.choice(n, size=4, replace=False)]
+            sig = (1 << picked[0]) | (1 << picked[1]) | (1 << picked[2]) | (1 << picked[3])
+            if sig in seen: continue
+            seen.add(sig)
+            population.append(tuple(sorted(picked)))
         return population
- 
+
     def _selection(population):
-        tournament = random.sample(population, ga_params['tournament_size'])
-        return max(tournament, key=lambda s: s.optimization_score)
-
-    def _crossover(p1, p2):
-        if random.random() > ga_params['crossover_rate']: return deepcopy(p1), deepcopy(p2)
-        child1_mods = p1.modules[:2] + [m for m in p2.modules if m.uuid not in {mod.uuid for mod in p1.modules[:2]}][:2]
-        child2_mods = p2.modules[:2] + [m for m in p1.modules if m.uuid not in {mod.uuid for mod in p2.modules[:2]}][:2]
-        return (ModuleSolution(modules=child1_mods) if len(child1_mods) == 4 else deepcopy(p1),
-                ModuleSolution(modules=child2_mods) if len(child2_mods) == 4 else deepcopy(p2))
-
-    def _mutate(solution, pool):
-        if random.random() > ga_params['mutation_rate']: return
-        current_ids = {m.uuid for m in solution.modules}
-        candidates = [m for m in pool if m.uuid not in current_ids]
-        if not candidates: return
-        index_to_replace = random.randrange(len(solution.modules))
-        solution.modules[index_to_replace] = random.choice(candidates)
-        solution.modules.sort(key=lambda m: m.uuid)
-
-    def _local_search(solution, pool):
-        best_solution = deepcopy(solution)
+        tournament_idx = rng.choice(len(population), size=min(ga_params['tournament_size'], len(population)), replace=False)
+        return max((population[int(i)] for i in tournament_idx), key=_fit)
+
+    # 查重用下标位集：occupied >> i & 1 一条位运算，省掉元组成员扫描
+    def _crossover(p1, p2, draw):
+        if draw > ga_params['crossover_rate']: return p1, p2
+        head1 = (1 << p1[0]) | (1 << p1[1])
+        head2 = (1 << p2[0]) | (1 << p2[1])
+        child1 = p1[:2] + tuple(i for i in p2 if not (head1 >> i) & 1)[:2]
+        child2 = p2[:2] + tuple(i for i in p1 if not (head2 >> i) & 1)[:2]
+        return (tuple(sorted(child1)) if len(child1) == 4 else p1,
+                tuple(sorted(child2)) if len(child2) == 4 else p2)
+
+    def _mutate(combo, draw):
+        if n <= 4 or draw > ga_params['mutation_rate']: return combo
+        occupied = (1 << combo[0]) | (1 << combo[1]) | (1 << combo[2]) | (1 << combo[3])
+        candidate = int(rng.integers(n))
+        while (occupied >> candidate) & 1:
+            candidate = int(rng.integers(n))
+        slot = int(rng.integers(4))
+        mutated = list(combo)
+        mutated[slot] = candidate
+        return tuple(sorted(mutated))
+
+    def _local_search(combo):
+        best = list(combo)
+        # 组合属性和只求一次，换一个槽位就是一次向量减加，
+        # 不必为每个邻居重新累加 4 行
+        sums = matrix[best].sum(axis=0, dtype=np.int16)
+        best_score = _fit(combo)
         while True:
             improved = False
-            for i in range(len(best_solution.modules)):
-                current_module = best_solution.modules[i]
-                best_replacement = None
-                best_new_score = best_solution.optimization_score
-                for new_module in pool:
-                    if new_module.uuid in {m.uuid for m in best_solution.modules if m.uuid != current_module.uuid}: continue
-                    temp_modules = best_solution.modules[:i] + [new_module] + best_solution.modules[i+1:]
-                    new_score = calculate_fitness(temp_modules, category, prioritized_attrs)
-                    if new_score > best_new_score:
-                        best_new_score = new_score
-                        best_replacement = new_module
-                if best_replacement:
-                    best_solution.modules[i] = best_replacement
-                    best_solution.optimization_score = best_new_score
-                    best_solution.modules.sort(key=lambda m: m.uuid)
-                    improved = True
+            for i in range(4):
+                out_row = matrix[best[i]]
+                for candidate in range(n):
+                    if candidate in best: continue
+                    new_sums = sums - out_row + matrix[candidate]
+                    new_score = score_from_sums(new_sums, has_prioritized, prioritized_mask,
+                                                target_mask, PHYSICAL_MASK, MAGIC_MASK)
+                    if new_score > best_score:
+                        best[i] = candidate
+                        sums = new_sums
+                        best_score = new_score
+                        improved = True
+                        break
+                if improved: break
             if not improved: break
-        return best_solution
-    
-    population = _initialize_population(modules, ga_params['population_size'])
+        result = tuple(sorted(best))
+        fitness_cache[result] = best_score
+        return result
+
+    population = _initialize_population(ga_params['population_size'])
     if not population: return []
+    # 最优分数在连续 patience 代内没有提升就提前收敛退出
+    best_history = deque(maxlen=ga_params.get('patience', 8))
     for _ in range(ga_params['generations']):
-        population.sort(key=lambda s: s.optimization_score, reverse=True)
-        next_gen, elite_count = [], int(ga_params['population_size'] * ga_params['elitism_rate'])
-        next_gen.extend(deepcopy(population[:elite_count]))
+        population.sort(key=_fit, reverse=True)
+        elite_count = int(ga_params['population_size'] * ga_params['elitism_rate'])
+        next_gen = population[:elite_count]
+        # 交叉/变异的概率判定一代只抽一批随机数，循环里按序消费
+        num_pairs = (ga_params['population_size'] - elite_count + 1) // 2 + 1
+        crossover_draws = rng.random(num_pairs)
+        mutation_draws = rng.random(2 * num_pairs)
+        pair = 0
         while len(next_gen) < ga_params['population_size']:
             p1, p2 = _selection(population), _selection(population)
-            c1, c2 = _crossover(p1, p2)
-            _mutate(c1, modules); _mutate(c2, modules)
-            next_gen.extend([c1, c2])
-        for individual in next_gen:
-            individual.optimization_score = calculate_fitness(individual.modules, category, prioritized_attrs)
-        next_gen.sort(key=lambda s: s.optimization_score, reverse=True)
+            c1, c2 = _crossover(p1, p2, crossover_draws[pair])
+            next_gen.extend((_mutate(c1, mutation_draws[2 * pair]), _mutate(c2, mutation_draws[2 * pair + 1])))
+            pair += 1
+        next_gen.sort(key=_fit, reverse=True)
         local_search_count = int(ga_params['population_size'] * ga_params['local_search_rate'])
         for i in range(local_search_count):
-            next_gen[i] = _local_search(next_gen[i], modules)
+            next_gen[i] = _local_search(next_gen[i])
         population = next_gen
-    return sorted(population, key=lambda s: s.optimization_score, reverse=True)
+        if len(set(population)) == 1:
+            break  # 种群完全收敛到单一组合，继续演化没有意义
+        best_history.append(max(_fit(combo) for combo in population))
+        if len(best_history) == best_history.maxlen and \
+                best_history[-1] - min(best_history) < 1e-6:
+            break
+    population.sort(key=_fit, reverse=True)
+    return [(combo, _fit(combo)) for combo in population]
+
+
+# 子进程全局上下文：initializer 里映射共享内存矩阵，任务本身零参数，
+# 模组池不会随每次 submit 被重复 pickle
+_GA_WORKER_CTX: Dict = {}
+
+
+def _init_ga_worker(shm_name, shape, category, prioritized_attrs, ga_params):
+    """ProcessPoolExecutor 的 initializer：attach 共享内存中的属性矩阵。"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _GA_WORKER_CTX['shm'] = shm  # 持有引用防止被回收
+    _GA_WORKER_CTX['matrix'] = np.ndarray(shape, dtype=np.int16, buffer=shm.buf)
+    _GA_WORKER_CTX['category'] = category
+    _GA_WORKER_CTX['prioritized_attrs'] = prioritized_attrs
+    _GA_WORKER_CTX['ga_params'] = ga_params
+
+
+def _run_ga_from_shared(seed):
+    """工作进程入口：在共享矩阵上跑一轮 GA，只回传下标组合和分数。"""
+    return _ga_campaign_core(_GA_WORKER_CTX['matrix'], _GA_WORKER_CTX['category'],
+                             _GA_WORKER_CTX['prioritized_attrs'], _GA_WORKER_CTX['ga_params'],
+                             seed=seed)
+
+
+def run_single_ga_campaign(
+    modules: List[ModuleInfo],
+    category: ModuleCategory,
+    prioritized_attrs: Optional[List[str]],
+    ga_params: Dict
+) -> List[ModuleSolution]:
+    """在模组列表上执行一次完整的遗传算法流程（单进程便捷入口）。"""
+    results = []
+    for combo, score in _ga_campaign_core(build_attr_matrix(modules), category,
+                                          prioritized_attrs, ga_params):
+        solution = ModuleSolution(modules=[modules[i] for i in combo])
+        solution.optimization_score = score
+        results.append(solution)
+    return results
 
 
 class ModuleOptimizer:
@@ -191,35 +362,38 @@ class ModuleOptimizer:
 
     def __init__(self):
         self.logger = logger
-        self._result_log_file = None
         self.ga_params = {
             'population_size': 100, 'generations': 40, 'mutation_rate': 0.1,
             'crossover_rate': 0.8, 'elitism_rate': 0.1, 'tournament_size': 5,
-            'local_search_rate': 0.3,
+            'local_search_rate': 0.3, 'patience': 8,
         }
         self.num_campaigns = max(1, os.cpu_count() - 1)
         self.quality_threshold = 12
         self.prefilter_top_n_per_attr = 30
         self.prefilter_top_n_total_value = 50
-
-    def _get_current_log_file(self) -> Optional[str]:
-        try:
-            root_logger = logging.getLogger()
-            for handler in root_logger.handlers:
-                if isinstance(handler, logging.FileHandler): return handler.baseFilename
-            return None
-        except Exception as e:
-            self.logger.warning(f"无法获取日志文件路径: {e}")
-            return None
-
-    def _log_result(self, message: str):
-        try:
-            if self._result_log_file is None: self._result_log_file = self._get_current_log_file()
-            if self._result_log_file and os.path.exists(self._result_log_file):
-                with open(self._result_log_file, 'a', encoding='utf-8') as f:
-                    f.write(message + '\n')
-        except Exception as e:
-            self.logger.warning(f"记录筛选结果失败: {e}")
+        # C(N,4) 不超过该值时直接穷举（JIT 内核下约一秒内完成），跳过 GA
+        self.exhaustive_limit = 2_000_000
+        self.exhaustive_keep_top = 200
+        # 模组列表指纹 -> 属性矩阵。GUI 按不同类型反复筛选同一批模组，
+        # 矩阵可以跨调用复用
+        self._matrix_cache: Dict[int, np.ndarray] = {}
+        self._rng = np.random.default_rng()
+        # 微调阶段模拟退火参数：初温按适应度量级取值，每步乘冷却系数
+        self.sa_iterations = 1500
+        self.sa_initial_temp = 50.0
+        self.sa_cooling = 0.995
+        self.sa_tabu_size = 50
+
+    def _get_attr_matrix(self, modules: List[ModuleInfo]) -> np.ndarray:
+        """带缓存的 build_attr_matrix。矩阵按行对应模组顺序，指纹需包含顺序。"""
+        fingerprint = hash(tuple(m.uuid for m in modules))
+        matrix = self._matrix_cache.get(fingerprint)
+        if matrix is None:
+            if len(self._matrix_cache) > 32:
+                self._matrix_cache.clear()
+            matrix = build_attr_matrix(modules)
+            self._matrix_cache[fingerprint] = matrix
+        return matrix
 
     def get_module_category(self, module: ModuleInfo) -> ModuleCategory:
         return MODULE_CATEGORY_MAP.get(module.config_id, ModuleCategory.ATTACK)
@@ -227,39 +401,33 @@ class ModuleOptimizer:
     def prefilter_modules(self, modules: List[ModuleInfo]) -> List[ModuleInfo]:
         self.logger.info(f"开始预筛选，原始模组数量: {len(modules)}")
         if not modules: return []
-        candidate_modules, attr_modules = set(), {p.name: [] for m in modules for p in m.parts}
-        for module in modules:
-            for part in module.parts: attr_modules[part.name].append((module, part.value))
-        for attr_name, module_values in attr_modules.items():
-            sorted_by_attr = sorted(module_values, key=lambda x: x[1], reverse=True)
-            candidate_modules.update(item[0] for item in sorted_by_attr[:self.prefilter_top_n_per_attr])
-        sorted_by_total_value = sorted(modules, key=lambda m: sum(p.value for p in m.parts), reverse=True)
-        candidate_modules.update(sorted_by_total_value[:self.prefilter_top_n_total_value])
-        filtered_modules = list(candidate_modules)
+        matrix = self._get_attr_matrix(modules)
+        n = len(modules)
+        # argpartition 是 O(N) 的选择而非 O(N log N) 的全排序：
+        # 每个属性取前 k 个持有者（剔除该属性为 0 的行），总属性值取前 k2 个
+        k = min(self.prefilter_top_n_per_attr, n)
+        top_attr = np.argpartition(-matrix, min(k - 1, n - 1), axis=0)[:k]
+        top_attr = top_attr[np.take_along_axis(matrix, top_attr, axis=0) > 0]
+        k2 = min(self.prefilter_top_n_total_value, n)
+        top_total = np.argpartition(-matrix.sum(axis=1), min(k2 - 1, n - 1))[:k2]
+        candidate_idx = np.unique(np.concatenate((top_attr.ravel(), top_total)))
+        filtered_modules = [modules[int(i)] for i in candidate_idx]
         self.logger.info(f"预筛选完成，候选池数量: {len(filtered_modules)}")
         return filtered_modules
 
     # --- CORRECTED METHOD ---
-    def calculate_combat_power(self, modules: List[ModuleInfo]) -> Tuple[int, Dict[str, int]]:
+    def calculate_combat_power(self, modules: List[ModuleInfo]) -> Tuple[int, np.ndarray]:
         """
-        修正后的战斗力计算方法。
+        修正后的战斗力计算方法（基于 SoA 属性矩阵的向量化实现）。
+
+        返回 (战斗力, (A,) 属性和向量)。
         """
-        attr_breakdown = {}
-        # 先初始化字典，再遍历模组进行累加
-        for module in modules:
-            for part in module.parts:
-                attr_breakdown[part.name] = attr_breakdown.get(part.name, 0) + part.value
-        
-        threshold_power, total_attr_value = 0, sum(attr_breakdown.values())
-        for attr_name, attr_value in attr_breakdown.items():
-            max_level = sum(1 for threshold in ATTR_THRESHOLDS if attr_value >= threshold)
-            if max_level > 0:
-                attr_type = ATTR_NAME_TYPE_MAP.get(attr_name, "basic")
-                power_map = SPECIAL_ATTR_POWER_MAP if attr_type == 'special' else BASIC_ATTR_POWER_MAP
-                threshold_power += power_map.get(max_level, 0)
-        
-        total_attr_power = TOTAL_ATTR_POWER_MAP.get(total_attr_value, 0)
-        return threshold_power + total_attr_power, attr_breakdown
+        sums = build_attr_matrix(modules).sum(axis=0)
+        levels = LEVEL_LUT[np.minimum(sums, MAX_SUM)]
+        # 等级 0 的战力表项为 0，按等级取表后求和即可，无需逐属性分支
+        threshold_power = int(np.where(SPECIAL_ATTR_MASK, SPECIAL_POWER_LUT[levels], BASIC_POWER_LUT[levels]).sum())
+        total_attr_power = TOTAL_ATTR_POWER_MAP.get(int(sums.sum()), 0)
+        return threshold_power + total_attr_power, sums
     # --- END OF CORRECTION ---
 
     def _preliminary_check(self, module_pool: List[ModuleInfo], prioritized_attrs: Optional[List[str]]) -> bool:
@@ -275,26 +443,26 @@ class ModuleOptimizer:
             return False
         return True
 
-    def _get_attribute_level_key(self, attr_breakdown: Dict[str, int]) -> Tuple[str, ...]:
-        """根据属性分布计算出一个用于去重的唯一键（基于属性等级）。"""
-        levels = []
-        for attr_name, value in sorted(attr_breakdown.items()):
-            level_str = "（等级0）"
-            if value >= 20: level_str = "（等级6）"
-            elif value >= 16: level_str = "（等级5）"
-            elif value >= 12: level_str = "（等级4）"
-            elif value >= 8: level_str = "（等级3）"
-            elif value >= 4: level_str = "（等级2）"
-            elif value >= 1: level_str = "（等级1）"
-            levels.append(f"{attr_name}{level_str}")
-        return tuple(levels)
+    def _get_attribute_level_key(self, attr_sums: np.ndarray) -> int:
+        """根据属性和向量计算出一个用于去重的唯一键（基于属性等级）。
+
+        每个属性等级 3 位，全部等级打包进一个 64 位整数：
+        单个 int 的哈希和比较都比 bytes/元组键更便宜。
+        """
+        levels = LEVEL_LUT[np.minimum(attr_sums, MAX_SUM)].astype(np.uint64)
+        return int((levels << _LEVEL_KEY_SHIFTS).sum())
 
     def optimize_modules(self, modules: List[ModuleInfo], category: ModuleCategory, top_n: int = 40,
                          prioritized_attrs: Optional[List[str]] = None,
                          progress_callback: Optional[Callable[[str], None]] = None) -> List[ModuleSolution]:
         
         self.logger.info(f"开始为 {category.value} 类型模组进行优化 (使用 {self.num_campaigns} 个并行任务)")
-        module_pool = modules if category == ModuleCategory.All else [m for m in modules if self.get_module_category(m) == category]
+        if category == ModuleCategory.All:
+            module_pool = modules
+        else:
+            # 直接查类别映射表，省掉逐模组的方法分派
+            category_of = MODULE_CATEGORY_MAP.get
+            module_pool = [m for m in modules if category_of(m.config_id, ModuleCategory.ATTACK) == category]
         
         if prioritized_attrs:
             self.logger.info(f"应用严格筛选: 只保留全部属性都在 {prioritized_attrs} 列表中的模组。")
@@ -309,8 +477,12 @@ class ModuleOptimizer:
             self.logger.warning("预筛选后模组数量不足4个，无法形成有效组合。")
             return []
 
-        high_quality_modules = [m for m in candidate_modules if sum(p.value for p in m.parts) >= self.quality_threshold]
-        low_quality_modules = [m for m in candidate_modules if sum(p.value for p in m.parts) < self.quality_threshold]
+        # 总属性值直接取候选矩阵的行和（矩阵进缓存，微调阶段还会用到），
+        # 按品质阈值一趟分池
+        totals = self._get_attr_matrix(candidate_modules).sum(axis=1)
+        high_mask = totals >= self.quality_threshold
+        high_quality_modules = [m for m, is_high in zip(candidate_modules, high_mask) if is_high]
+        low_quality_modules = [m for m, is_high in zip(candidate_modules, high_mask) if not is_high]
         self.logger.info(f"模组分池完成：高品质模组 {len(high_quality_modules)} 个，低品质模组 {len(low_quality_modules)} 个。")
         if len(high_quality_modules) < 4:
             self.logger.warning("高品质模组数量不足4个，将使用全部候选模组进行优化。")
@@ -318,21 +490,59 @@ class ModuleOptimizer:
             low_quality_modules = []
 
         all_best_solutions = []
-        with ProcessPoolExecutor(max_workers=self.num_campaigns) as executor:
+        pool_n = len(high_quality_modules)
+        total_combinations = pool_n * (pool_n - 1) * (pool_n - 2) * (pool_n - 3) // 24
+        if total_combinations <= self.exhaustive_limit:
+            # 小规模池直接穷举：结果是确定性的全局最优，且比多轮GA更快
+            self.logger.info(f"--- 第一阶段：候选池较小，穷举全部 {total_combinations} 个组合 ---")
+            if progress_callback: progress_callback("正在穷举所有组合...")
+            all_best_solutions = self._enumerate_solutions(high_quality_modules, category, prioritized_attrs)
+            if all_best_solutions:
+                self.logger.info(f"穷举完成。最高适应度: {all_best_solutions[0].optimization_score:.2f}")
+        else:
+            matrix = self._get_attr_matrix(high_quality_modules)
             self.logger.info(f"--- 第一阶段：在高品质模组池上并行运行 {self.num_campaigns} 轮GA ---")
             if progress_callback: progress_callback(f"正在运行 {self.num_campaigns} 个并行优化任务...")
-            futures = [executor.submit(run_single_ga_campaign, high_quality_modules, category, prioritized_attrs, self.ga_params)
-                       for _ in range(self.num_campaigns)]
-            for i, future in enumerate(as_completed(futures)):
+            # SeedSequence.spawn 保证各任务的随机流互不重叠
+            seeds = np.random.SeedSequence().spawn(self.num_campaigns)
+
+            def consume_campaigns(futures):
+                for i, future in enumerate(as_completed(futures)):
+                    try:
+                        campaign_results = future.result()
+                        if campaign_results:
+                            for combo, score in campaign_results:
+                                solution = ModuleSolution(modules=[high_quality_modules[j] for j in combo])
+                                solution.optimization_score = score
+                                all_best_solutions.append(solution)
+                            best_score = campaign_results[0][1]
+                            self.logger.info(f"任务 {i+1}/{self.num_campaigns} 完成。最高适应度: {best_score:.2f}")
+                            if progress_callback: progress_callback(f"任务 {i+1}/{self.num_campaigns} 完成. 最高分: {best_score:.2f}")
+                    except Exception as e:
+                        self.logger.error(f"一个优化任务失败: {e}")
+
+            if NUMBA_AVAILABLE:
+                # JIT 内核以 nogil 编译，热路径不持有 GIL，线程池即可并行；
+                # 各轮直接共享同一矩阵，免去子进程 spawn 和共享内存的开销
+                with ThreadPoolExecutor(max_workers=self.num_campaigns) as executor:
+                    consume_campaigns([
+                        executor.submit(_ga_campaign_core, matrix, category,
+                                        prioritized_attrs, self.ga_params, seed)
+                        for seed in seeds])
+            else:
+                # 纯 Python 退化路径仍受 GIL 约束，保留进程池：
+                # 属性矩阵放进共享内存，initializer 在每个子进程 attach 一次；
+                # 任务零参数提交，结果只回传下标组合和分数，模组对象不跨进程
+                shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+                np.ndarray(matrix.shape, dtype=np.int16, buffer=shm.buf)[:] = matrix
                 try:
-                    campaign_results = future.result()
-                    if campaign_results:
-                        all_best_solutions.extend(campaign_results)
-                        best_score = campaign_results[0].optimization_score
-                        self.logger.info(f"任务 {i+1}/{self.num_campaigns} 完成。最高适应度: {best_score:.2f}")
-                        if progress_callback: progress_callback(f"任务 {i+1}/{self.num_campaigns} 完成. 最高分: {best_score:.2f}")
-                except Exception as e:
-                    self.logger.error(f"一个优化任务失败: {e}")
+                    with ProcessPoolExecutor(
+                            max_workers=self.num_campaigns, initializer=_init_ga_worker,
+                            initargs=(shm.name, matrix.shape, category, prioritized_attrs, self.ga_params)) as executor:
+                        consume_campaigns([executor.submit(_run_ga_from_shared, seed) for seed in seeds])
+                finally:
+                    shm.close()
+                    shm.unlink()
 
         self.logger.info("--- 第二阶段：使用低品质模组对最优解集进行精细微调 ---")
         if progress_callback: progress_callback("第二阶段：精细微调顶尖结果...")
@@ -353,14 +563,14 @@ class ModuleOptimizer:
         
         final_results = unique_solutions + refined_solutions
         for solution in final_results:
-            if not solution.attr_breakdown:
-                solution.score, solution.attr_breakdown = self.calculate_combat_power(solution.modules)
+            if solution.attr_sums is None:
+                solution.score, solution.attr_sums = self.calculate_combat_power(solution.modules)
 
         final_results.sort(key=lambda s: s.optimization_score, reverse=True)
         
         solutions_by_attr_level = {}
         for solution in final_results:
-            attr_level_key = self._get_attribute_level_key(solution.attr_breakdown)
+            attr_level_key = self._get_attribute_level_key(solution.attr_sums)
             if attr_level_key not in solutions_by_attr_level:
                 solutions_by_attr_level[attr_level_key] = solution
 
@@ -372,39 +582,118 @@ class ModuleOptimizer:
 
         return deduplicated_solutions[:top_n]
     
+    def _enumerate_solutions(self, modules: List[ModuleInfo], category: ModuleCategory,
+                             prioritized_attrs: Optional[List[str]]) -> List[ModuleSolution]:
+        """用 JIT 内核穷举 C(N,4) 组合，返回按适应度降序的前若干个解。"""
+        matrix = self._get_attr_matrix(modules)
+        # 按总属性值降序排列，让高分组合尽早进入缓冲区，提高剪枝命中率
+        order = np.argsort(-matrix.sum(axis=1))
+        matrix = np.ascontiguousarray(matrix[order])
+        modules = [modules[int(i)] for i in order]
+        if prioritized_attrs:
+            has_prioritized, prioritized_mask = True, _attr_mask(prioritized_attrs)
+        else:
+            has_prioritized, prioritized_mask = False, EMPTY_MASK
+        scores, quads = enumerate_top_quads(
+            matrix, build_suffix_max(matrix), self.exhaustive_keep_top,
+            has_prioritized, prioritized_mask,
+            CATEGORY_MASKS[category], PHYSICAL_MASK, MAGIC_MASK
+        )
+        solutions = []
+        for t in np.argsort(-scores):
+            solution = ModuleSolution(modules=[modules[int(q)] for q in quads[t]])
+            solution.optimization_score = float(scores[t])
+            solutions.append(solution)
+        return solutions
+
     def _local_search_improvement(self, solution: ModuleSolution, module_pool: List[ModuleInfo], category: ModuleCategory, prioritized_attrs: Optional[List[str]]) -> ModuleSolution:
-        best_solution = deepcopy(solution)
-        best_solution.optimization_score = calculate_fitness(best_solution.modules, category, prioritized_attrs)
+        # 解中的模组可能不在候选池里，补到矩阵末尾保证可索引
+        pool = list(module_pool)
+        uuid_to_idx = {m.uuid: i for i, m in enumerate(pool)}
+        for module in solution.modules:
+            if module.uuid not in uuid_to_idx:
+                uuid_to_idx[module.uuid] = len(pool)
+                pool.append(module)
+        matrix = self._get_attr_matrix(pool)
+        if prioritized_attrs:
+            has_prioritized, prioritized_mask = True, _attr_mask(prioritized_attrs)
+        else:
+            has_prioritized, prioritized_mask = False, EMPTY_MASK
+        target_mask = CATEGORY_MASKS[category]
+
+        cur_idx = [uuid_to_idx[m.uuid] for m in solution.modules]
+        if len(pool) <= 4:
+            return solution
+        # 当前组合的属性和只算一次；换入一个模组就变成一次向量减加
+        cur_sums = matrix[cur_idx].sum(axis=0, dtype=np.int16)
+        cur_score = score_from_sums(cur_sums, has_prioritized, prioritized_mask,
+                                    target_mask, PHYSICAL_MASK, MAGIC_MASK)
+        best_idx = list(cur_idx)
+        best_score = cur_score
+
+        # 模拟退火：单条长路径代替反复重启爬山，温度允许阶段性接受
+        # 变差的交换以跨越局部最优；禁忌表阻止刚做过的交换立刻回退
+        rng = self._rng
+        tabu = deque(maxlen=self.sa_tabu_size)
+        temp = self.sa_initial_temp
+        pool_size = len(pool)
+        for _ in range(self.sa_iterations):
+            slot = int(rng.integers(4))
+            cand = int(rng.integers(pool_size))
+            if cand in cur_idx:
+                temp *= self.sa_cooling
+                continue
+            out = cur_idx[slot]
+            new_sums = cur_sums - matrix[out] + matrix[cand]
+            new_score = score_from_sums(new_sums, has_prioritized, prioritized_mask,
+                                        target_mask, PHYSICAL_MASK, MAGIC_MASK)
+            # 特赦准则：禁忌交换若刷新全局最优仍然放行
+            if ((out, cand) in tabu or (cand, out) in tabu) and new_score <= best_score:
+                temp *= self.sa_cooling
+                continue
+            delta = new_score - cur_score
+            if delta > 0 or rng.random() < math.exp(delta / temp):
+                cur_idx[slot] = cand
+                cur_sums = new_sums
+                cur_score = new_score
+                tabu.append((out, cand))
+                if cur_score > best_score:
+                    best_idx = list(cur_idx)
+                    best_score = cur_score
+            temp *= self.sa_cooling
+
+        # 收尾用一轮确定性爬山把最优解推到局部最优：
+        # 一个槽位的全部候选交换一次批量打分，取 argmax
+        sums = matrix[best_idx].sum(axis=0, dtype=np.int16)
         while True:
             improved = False
-            for i in range(len(best_solution.modules)):
-                for new_module in module_pool:
-                    if new_module.uuid in {m.uuid for m in best_solution.modules}: continue
-                    temp_modules = best_solution.modules[:i] + [new_module] + best_solution.modules[i+1:]
-                    new_score = calculate_fitness(temp_modules, category, prioritized_attrs)
-                    if new_score > best_solution.optimization_score:
-                        best_solution.modules = temp_modules
-                        best_solution.optimization_score = new_score
-                        best_solution.modules.sort(key=lambda m: m.uuid)
-                        improved = True
-                        break 
-                if improved: break
+            for i in range(len(best_idx)):
+                cand_sums = (sums - matrix[best_idx[i]]) + matrix
+                scores = score_batch(cand_sums, has_prioritized, prioritized_mask,
+                                     target_mask, PHYSICAL_MASK, MAGIC_MASK)
+                scores[best_idx] = -1.0  # 已占用的模组不可换入
+                cand = int(np.argmax(scores))
+                if scores[cand] > best_score:
+                    best_idx[i] = cand
+                    sums = cand_sums[cand].copy()
+                    best_score = float(scores[cand])
+                    improved = True
+                    break
             if not improved: break
+
+        best_solution = ModuleSolution(modules=[pool[i] for i in best_idx])
+        best_solution.optimization_score = float(best_score)
         return best_solution
         
     def print_solution_details(self, solution: ModuleSolution, rank: int):
-        header = f"\n=== 第 {rank} 名搭配 (适应分: {solution.optimization_score:.2f}) ==="
-        print(header); self._log_result(header)
-        total_value_str = f"总属性值: {sum(solution.attr_breakdown.values())}"
-        print(total_value_str); self._log_result(total_value_str)
-        combat_power_str = f"战斗力: {solution.score}"
-        print(combat_power_str); self._log_result(combat_power_str)
-        print("\n模组列表:"); self._log_result("\n模组列表:")
+        self.logger.info(f"=== 第 {rank} 名搭配 (适应分: {solution.optimization_score:.2f}) ===")
+        self.logger.info(f"总属性值: {sum(solution.attr_breakdown.values())}")
+        self.logger.info(f"战斗力: {solution.score}")
+        self.logger.info("模组列表:")
         for i, module in enumerate(solution.modules, 1):
             parts_str = ", ".join([f"{p.name}+{p.value}" for p in module.parts])
-            module_line = f"  {i}. {module.name} (品质{module.quality}) - {parts_str}"
-            print(module_line); self._log_result(module_line)
-        print("\n属性分布:"); self._log_result("\n属性分布:")
+            self.logger.info(f"  {i}. {module.name} (品质{module.quality}) - {parts_str}")
+        self.logger.info("属性分布:")
         for attr_name, value in sorted(solution.attr_breakdown.items()):
             orname="（等级0）"
             if value >= 20: orname = "（等级6）"
@@ -413,31 +702,27 @@ class ModuleOptimizer:
             elif value >= 8: orname = "（等级3）"
             elif value >= 4: orname = "（等级2）"
             elif value >= 1: orname = "（等级1）"
-            attr_line = f"  {attr_name}{orname}: +{value}"
-            print(attr_line); self._log_result(attr_line)
+            self.logger.info(f"  {attr_name}{orname}: +{value}")
 
     def optimize_and_display(self, modules: List[ModuleInfo], category: ModuleCategory = ModuleCategory.All,
                            top_n: int = 40, prioritized_attrs: Optional[List[str]] = None,
                            progress_callback: Optional[Callable[[str], None]] = None):
-        separator = f"\n{'='*50}"
-        print(separator); self._log_result(separator)
-        title = f"模组搭配优化 - {category.value} 类型"
-        print(title); self._log_result(title)
-        print(separator); self._log_result(separator)
-        
+        separator = '=' * 50
+        self.logger.info(separator)
+        self.logger.info(f"模组搭配优化 - {category.value} 类型")
+        self.logger.info(separator)
+
         optimal_solutions = self.optimize_modules(modules, category, top_n, prioritized_attrs, progress_callback)
-        
+
         if not optimal_solutions:
-            msg = f"未找到符合所有筛选条件的有效搭配。\n提示：请检查筛选属性是否过于苛刻，或模组池中缺少符合要求的模组。"
-            print(msg); self._log_result(msg)
+            self.logger.info("未找到符合所有筛选条件的有效搭配。\n提示：请检查筛选属性是否过于苛刻，或模组池中缺少符合要求的模组。")
             return
-        
-        found_msg = f"\n找到 {len(optimal_solutions)} 个基于属性等级去重后的最优搭配 (将从末位开始显示，最优解在最后):"
-        print(found_msg); self._log_result(found_msg)
-        
+
+        self.logger.info(f"找到 {len(optimal_solutions)} 个基于属性等级去重后的最优搭配 (将从末位开始显示，最优解在最后):")
+
         num_solutions = len(optimal_solutions)
         for i, solution in enumerate(reversed(optimal_solutions)):
             rank = num_solutions - i
             self.print_solution_details(solution, rank)
-        
-        print(separator); self._log_result(separator)
\ No newline at end of file
+
+        self.logger.info(separator)
\ No newline at end of file
@@ -1,5 +1,6 @@
 # module_parser.py
 
+import array
 import json
 import logging
 from typing import Dict, List, Optional, Any
@@ -11,21 +12,33 @@ from module_types import (
 
 logger = get_logger(__name__)
 
+# 解析性能依赖 protobuf 的 upb/C++ 后端（protobuf>=4.21 默认启用）。
+# 若环境变量强制回退到纯 Python 实现，字段访问会慢一个数量级，提前告警。
+try:
+    from google.protobuf.internal import api_implementation
+    if api_implementation.Type() == 'python':
+        logger.warning("protobuf 正在使用纯 Python 后端，模组解析会明显变慢；"
+                       "建议安装官方 protobuf 轮子并去掉 PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION 覆盖。")
+except ImportError:
+    pass
+
 def is_iterable(obj):
-    """辅助函数：检查一个对象是否是可迭代的（但不是字符串）。"""
-    if isinstance(obj, str):
-        return False
-    try:
-        iter(obj)
-        return True
-    except TypeError:
-        return False
+    """辅助函数：检查一个对象是否是可迭代的（但不是字符串）。
+
+    ModParts/InitLinkNums 只会是 protobuf repeated 容器或单个数值，
+    直接做类型判断即可，不必走 iter() + TypeError 的异常探测。
+    """
+    return not isinstance(obj, (int, float, str))
 
 class ModuleParser:
     """模组解析器"""
     
     def __init__(self):
         self.logger = logger
+        # package_type -> 是否模组背包。协议里各背包类型固定不变，
+        # 首包探测一次后按 key 直接分流，后续解析免去逐包的首项探测
+        self._mod_package_types = set()
+        self._non_mod_package_types = set()
     
     def parse_module_info(self, v_data: CharSerialize, attributes: List[str] = None, 
                          exclude_attributes: List[str] = None, match_count: int = 1) -> List[ModuleInfo]:
@@ -36,52 +49,90 @@ class ModuleParser:
         self.logger.info("开始解析模组...")
         mod_infos = v_data.Mod.ModInfos
         modules = []
+        modules_append = modules.append  # 热循环内省一次属性查找
+        mod_infos_get = mod_infos.get
+        # 名字解析的本地缓存：预填已知表，未知 id 的回退串在首次出现时
+        # 由 setdefault 构造并缓存，此后同一 id 不再重复分配字符串
+        attr_names = dict(MODULE_ATTR_NAMES)
+        module_names = dict(MODULE_NAMES)
+        # 属性筛选融合进解析循环：会被丢弃的模组连 ModulePart/ModuleInfo
+        # 都不分配，省去先全量构建再二次遍历过滤的开销
+        incl = frozenset(attributes) if attributes else None
+        excl = frozenset(exclude_attributes) if exclude_attributes else None
+        parsed_count = 0
 
         for package_type, package in v_data.ItemPackage.Packages.items():
-            if not (item := next(iter(package.Items.values()), None)) or not item.HasField('ModNewAttr'):
-                continue # 如果不是模组背包，则跳过
+            if package_type in self._non_mod_package_types:
+                continue # 已知的非模组背包，直接跳过
+            if package_type not in self._mod_package_types:
+                if not (item := next(iter(package.Items.values()), None)):
+                    continue # 空背包无从判断类型，本次跳过、下次再探测
+                if not item.HasField('ModNewAttr'):
+                    self._non_mod_package_types.add(package_type)
+                    continue # 如果不是模组背包，则跳过
+                self._mod_package_types.add(package_type)
 
             for key, item in package.Items.items():
-                if item.HasField('ModNewAttr') and item.ModNewAttr.ModParts:
+                # ModNewAttr 只经由描述符取一次：纯 Python protobuf 的
+                # 字段访问开销在热循环里不可忽略
+                if item.HasField('ModNewAttr'):
+                    mod_parts = item.ModNewAttr.ModParts
+                    if not mod_parts:
+                        continue
                     config_id = item.ConfigId
-                    mod_info_details = mod_infos.get(key)
+                    mod_info_details = mod_infos_get(key)
                     if not mod_info_details: continue
 
-                    module_info = ModuleInfo(
-                        name=MODULE_NAMES.get(config_id, f"未知模组({config_id})"),
+                    # 原始数据可能是一个整数（当只有一个部件时），也可能是一个列表。
+                    # repeated 容器整体拷入 array('i')：一次 C 级批量复制，
+                    # 之后的 len()/迭代不再经过 protobuf 描述符；
+                    # zip 以较短一侧为准，天然替代逐下标的越界检查
+                    parts_arr = array.array('i')
+                    if is_iterable(mod_parts):
+                        parts_arr.extend(mod_parts)
+                    else:
+                        parts_arr.append(mod_parts)
+                    nums_arr = array.array('i')
+                    init_link_nums = mod_info_details.InitLinkNums
+                    if is_iterable(init_link_nums):
+                        nums_arr.extend(init_link_nums)
+                    else:
+                        nums_arr.append(init_link_nums)
+
+                    parsed_count += 1
+
+                    # or 短路让 setdefault 及其 f-string 只在缓存未命中时求值
+                    part_names = [attr_names.get(part_id) or attr_names.setdefault(part_id, f"未知属性({part_id})")
+                                  for part_id, _ in zip(parts_arr, nums_arr)]
+
+                    # 先用词条名做筛选判定，不通过的模组直接跳过构建。
+                    # 常见的"任一命中"/"全部命中"用更快的专用集合判定
+                    if excl and not excl.isdisjoint(part_names):
+                        continue
+                    if incl:
+                        if match_count <= 1:
+                            if incl.isdisjoint(part_names):
+                                continue
+                        elif match_count >= len(incl):
+                            if not incl.issubset(part_names):
+                                continue
+                        elif len(incl.intersection(part_names)) < match_count:
+                            continue
+
+                    modules_append(ModuleInfo(
+                        name=module_names.get(config_id) or module_names.setdefault(config_id, f"未知模组({config_id})"),
                         config_id=config_id,
                         uuid=item.Uuid,
                         quality=item.Quality,
-                        parts=[]
-                    )
+                        parts=[ModulePart(id=part_id, name=part_name, value=value)
+                               for part_id, value, part_name in zip(parts_arr, nums_arr, part_names)]
+                    ))
 
-                    # --- 错误修正开始 ---
-                    # 原始数据可能是一个整数（当只有一个部件时），也可能是一个列表。
-                    # 我们需要统一处理成列表格式。
-                    raw_mod_parts = item.ModNewAttr.ModParts
-                    mod_parts = [raw_mod_parts] if not is_iterable(raw_mod_parts) else list(raw_mod_parts)
-                    
-                    raw_init_link_nums = mod_info_details.InitLinkNums
-                    init_link_nums = [raw_init_link_nums] if not is_iterable(raw_init_link_nums) else list(raw_init_link_nums)
-                    # --- 错误修正结束 ---
-
-                    for i, part_id in enumerate(mod_parts):
-                        if i < len(init_link_nums):
-                            module_info.parts.append(ModulePart(
-                                id=part_id,
-                                name=MODULE_ATTR_NAMES.get(part_id, f"未知属性({part_id})"),
-                                value=init_link_nums[i]
-                            ))
-                    modules.append(module_info)
-        
-        self.logger.info(f"共解析到 {len(modules)} 个模组。")
-        
-        if attributes or exclude_attributes:
-            filtered_modules = self._filter_modules_by_attributes(modules, attributes, exclude_attributes, match_count)
-            self.logger.info(f"根据基础属性规则筛选后剩余 {len(filtered_modules)} 个模组。")
-            return filtered_modules
-        else:
-            return modules
+        self.logger.info(f"共解析到 {parsed_count} 个模组。")
+
+        if incl or excl:
+            self.logger.info(f"根据基础属性规则筛选后剩余 {len(modules)} 个模组。")
+        return modules
     
     def _filter_modules_by_attributes(self, modules: List[ModuleInfo], attributes: List[str] = None, 
                                      exclude_attributes: List[str] = None, match_count: int = 1) -> List[ModuleInfo]:
@@ -89,18 +140,28 @@ class ModuleParser:
         if not attributes and not exclude_attributes:
             return modules
 
+        # 筛选条件转成 frozenset，循环内用 C 层的集合运算代替逐词条线性扫描。
+        # 匹配谓词按 match_count 在循环外选定："任一命中"与"全部命中"
+        # 有内部短路的专用判定，通用计数只留给 1<k<N 的情形
+        incl = frozenset(attributes) if attributes else None
+        excl = frozenset(exclude_attributes) if exclude_attributes else None
+        if incl is None:
+            matches = None
+        elif match_count <= 1:
+            matches = lambda attrs: not incl.isdisjoint(attrs)
+        elif match_count >= len(incl):
+            matches = incl.issubset
+        else:
+            matches = lambda attrs: len(attrs & incl) >= match_count
+
         filtered_modules = []
         for module in modules:
             module_attrs = {part.name for part in module.parts}
-            
-            if exclude_attributes and any(attr in module_attrs for attr in exclude_attributes):
+
+            if excl and not module_attrs.isdisjoint(excl):
                 continue
-            
-            if attributes:
-                matching_attrs_count = sum(1 for attr in attributes if attr in module_attrs)
-                if matching_attrs_count >= match_count:
-                    filtered_modules.append(module)
-            else:
+
+            if matches is None or matches(module_attrs):
                 filtered_modules.append(module)
-        
+
         return filtered_modules
\ No newline at end of file
@@ -202,7 +202,9 @@ ATTR_NAME_TYPE_MAP = {
 
 
 
-@dataclass
+# slots=True 去掉实例 __dict__：解析一次会生成成千上万个部件对象，
+# 每个省约百字节，属性访问也从字典查找变成偏移寻址
+@dataclass(slots=True)
 class ModulePart:
     """模组部件信息"""
     id: int
@@ -210,7 +212,7 @@ class ModulePart:
     value: int
 
 
-@dataclass(eq=True)
+@dataclass(eq=True, slots=True)
 class ModuleInfo:
     """模组信息"""
     name: str
@@ -4,6 +4,7 @@
 
 import json
 import logging
+import queue
 import time
 import threading
 import argparse
@@ -60,7 +61,14 @@ class StarResonanceMonitor:
         # 存储解析结果
         self.player_modules = {}  # 玩家UID -> 模组列表
         self.module_history = []  # 模组历史记录
-        
+
+        # 解析与抓包解耦：回调只把 v_data 入队即返回，专职线程消费解析，
+        # 队列有界，解析不过来时直接丢弃新包而不是阻塞抓包线程
+        self._parse_queue: queue.Queue = queue.Queue(maxsize=4)
+        self._parse_thread: Optional[threading.Thread] = None
+        # 首次成功解析后置位：protobuf 全量解析只跑一次，后续包直接丢弃
+        self._parsed_once = False
+
     def start_monitoring(self):
         """开始监控"""
         self.is_running = True
@@ -80,7 +88,9 @@ class StarResonanceMonitor:
         else:
             logger.info("网络接口: 自动")
         
-        # 启动抓包
+        # 启动解析线程和抓包
+        self._parse_thread = threading.Thread(target=self._parse_loop, daemon=True)
+        self._parse_thread.start()
         self.packet_capture.start_capture(self._on_sync_container_data)
         
         
@@ -90,21 +100,45 @@ class StarResonanceMonitor:
         """停止监控"""
         self.is_running = False
         self.packet_capture.stop_capture()
-        
+        if self._parse_thread is not None:
+            self._parse_queue.put(None)  # 哨兵值，通知解析线程退出
+            self._parse_thread = None
+
         logger.info("=== 监控已停止 ===")
-        
+
     def _on_sync_container_data(self, data: Dict[str, Any]):
-        """处理SyncContainerData数据包"""
+        """处理SyncContainerData数据包（抓包线程回调，只入队不解析）"""
         self.stats['sync_container_packets'] += 1
-        
-        try:
-            # 解析模组信息
-            v_data = data.get('v_data')
-            if v_data:
-                self.module_parser.parse_module_info(v_data, category=self.category, attributes=self.attributes)
-                    
-        except Exception as e:
-            logger.error(f"处理SyncContainerData数据包失败: {e}")
+
+        if self._parsed_once:
+            return
+
+        v_data = data.get('v_data')
+        if v_data:
+            try:
+                self._parse_queue.put_nowait(v_data)
+            except queue.Full:
+                pass  # 解析跟不上时丢弃，避免阻塞抓包
+
+    def _parse_loop(self):
+        """解析线程主循环：消费队列中的 v_data 并解析。"""
+        while True:
+            v_data = self._parse_queue.get()
+            if v_data is None:
+                break
+            if self._parsed_once:
+                continue  # 已解析过，清空积压的包即可
+            try:
+                # parse_module_info 没有 category 参数，
+                # 类型筛选属于优化阶段的职责，这里只按属性词条过滤
+                modules = self.module_parser.parse_module_info(v_data, attributes=self.attributes)
+                if modules:
+                    self.module_history.extend(modules)
+                    self.stats['parsed_modules'] += len(modules)
+                    self._parsed_once = True
+            except Exception as e:
+                # 解析线程死掉是无声的，宽捕获保证坏包只丢一包不丢线程
+                logger.error(f"处理SyncContainerData数据包失败: {e}")
             
 
             
@@ -1,8 +1,9 @@
 # star_resonance_monitor_core.py
 
 import logging
+import threading
 import time
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Iterable, Optional, Callable
 
 from logging_config import get_logger
 from module_parser import ModuleParser
@@ -11,10 +12,16 @@ from packet_capture import PacketCapture
 
 logger = get_logger(__name__)
 
+# 类型名 -> 枚举的固定映射，免得每次重新筛选都重建字典
+_CATEGORY_MAP = {
+    "攻击": ModuleCategory.ATTACK, "守护": ModuleCategory.GUARDIAN,
+    "辅助": ModuleCategory.SUPPORT, "全部": ModuleCategory.All
+}
+
 class StarResonanceMonitor:
     """星痕共鸣监控器"""
 
-    def __init__(self, interface_name: str, category: str = "攻击", attributes: List[str] = None, 
+    def __init__(self, interface_name: str, category: str = "攻击", attributes: Iterable[str] = None,
                  on_data_captured_callback: Optional[Callable] = None,
                  progress_callback: Optional[Callable[[str], None]] = None): # 添加进度回调
         self.interface_name = interface_name
@@ -26,54 +33,88 @@ class StarResonanceMonitor:
         self.is_running = False
         self.captured_modules: Optional[List[Any]] = None
 
+        # 换线/登录时 SyncContainerData 往往成串到达，每包全量解析纯属
+        # 重复劳动。这里做 50ms 去抖：只暂存最新一包，定时器到点后解析
+        self._pending_v_data: Optional[Any] = None
+        self._debounce_timer: Optional[threading.Timer] = None
+        self._pending_lock = threading.Lock()
+        self._debounce_seconds = 0.05
+
         self.packet_capture = PacketCapture(self.interface_name)
         self.module_parser = ModuleParser()
         self.module_optimizer = ModuleOptimizer()
 
+    def reconfigure(self, category: str, attributes: Iterable[str] = None):
+        """更新初始筛选条件并清空已捕获数据，以便复用抓包组件重新开始监控。"""
+        self.initial_category = category
+        self.initial_attributes = attributes or []
+        self.captured_modules = None
+
     def start_monitoring(self):
         self.is_running = True
-        print("=== 星痕共鸣模组监控器启动 by 伊咪塔 \n")
-        print("=== 本程序开源地址： https://github.com/amoeet/StarResonanceAutoMod \n")
-        print(f"初始模组类型: {self.initial_category}\n")
+        logger.info("=== 星痕共鸣模组监控器启动 by 伊咪塔 ===")
+        logger.info("=== 本程序开源地址： https://github.com/amoeet/StarResonanceAutoMod ===")
+        logger.info(f"初始模组类型: {self.initial_category}")
         if self.initial_attributes:
-            print(f"初始属性筛选: {', '.join(self.initial_attributes)}\n")
+            logger.info(f"初始属性筛选: {', '.join(self.initial_attributes)}")
         else:
-            print("初始属性筛选: 无\n")
-        print(f"网络接口名称: {self.interface_name}\n")
+            logger.info("初始属性筛选: 无")
+        logger.info(f"网络接口名称: {self.interface_name}")
 
         self.packet_capture.start_capture(self._on_sync_container_data)
-        print("监控已启动，请换线、重新登录或切换角色以便获取模组信息...\n")
+        logger.info("监控已启动，请换线、重新登录或切换角色以便获取模组信息...")
 
     def stop_monitoring(self):
         if not self.is_running:
             return
         self.is_running = False
         self.packet_capture.stop_capture()
-        print("=== 监控已停止 ===")
+        with self._pending_lock:
+            if self._debounce_timer is not None:
+                self._debounce_timer.cancel()
+                self._debounce_timer = None
+            self._pending_v_data = None
+        logger.info("=== 监控已停止 ===")
 
     def _on_sync_container_data(self, data: Dict[str, Any]):
+        v_data = data.get('v_data')
+        if not v_data:
+            return
+        if self.captured_modules is not None:
+            logger.info("已捕获模组数据，忽略后续数据包。如需更新请重启监控。")
+            return
+        # 只暂存最新一包；去抖窗口内后到的数据包直接覆盖前面的
+        with self._pending_lock:
+            self._pending_v_data = v_data
+            if self._debounce_timer is None:
+                self._debounce_timer = threading.Timer(self._debounce_seconds, self._process_pending_data)
+                self._debounce_timer.daemon = True
+                self._debounce_timer.start()
+
+    def _process_pending_data(self):
+        """去抖定时器回调：解析窗口内收到的最新一包数据。"""
+        with self._pending_lock:
+            v_data = self._pending_v_data
+            self._pending_v_data = None
+            self._debounce_timer = None
+        if v_data is None or self.captured_modules is not None:
+            return
         try:
-            v_data = data.get('v_data')
-            if v_data:
-                print("捕获到模组数据，开始解析...")
-                all_modules = self.module_parser.parse_module_info(v_data)
-                
-                if all_modules:
-                    # 仅在第一次捕获时存储数据并触发回调
-                    if self.captured_modules is None:
-                        self.captured_modules = all_modules
-                        print(f"成功解析并存储 {len(self.captured_modules)} 个模组。")
-                        
-                        # 执行初始筛选
-                        self.rescreen_modules(self.initial_category, self.initial_attributes)
-                        
-                        # 通知GUI启用“重新筛选”按钮
-                        if self.on_data_captured_callback:
-                            self.on_data_captured_callback()
-                    else:
-                        print("已捕获模组数据，忽略后续数据包。如需更新请重启监控。")
-                else:
-                    print("数据包中未找到有效的模组信息。")
+            logger.info("捕获到模组数据，开始解析...")
+            all_modules = self.module_parser.parse_module_info(v_data)
+
+            if all_modules:
+                self.captured_modules = all_modules
+                logger.info(f"成功解析并存储 {len(self.captured_modules)} 个模组。")
+
+                # 执行初始筛选
+                self.rescreen_modules(self.initial_category, self.initial_attributes)
+
+                # 通知GUI启用“重新筛选”按钮
+                if self.on_data_captured_callback:
+                    self.on_data_captured_callback()
+            else:
+                logger.info("数据包中未找到有效的模组信息。")
         except Exception as e:
             logger.error(f"处理数据包失败: {e}")
 
@@ -81,21 +122,17 @@ class StarResonanceMonitor:
         """检查是否已捕获并存储了模组数据"""
         return self.captured_modules is not None
 
-    def rescreen_modules(self, category: str, attributes: List[str]):
+    def rescreen_modules(self, category: str, attributes: Iterable[str]):
         """使用新的筛选条件对已捕获的数据进行重新优化"""
         if not self.has_captured_data():
-            print("错误：没有可供重新筛选的模组数据。")
+            logger.error("没有可供重新筛选的模组数据。")
             return
 
-        print(f"\n--- 开始使用新条件重新筛选 ---")
-        print(f"模组类型: {category}")
-        print(f"优先属性: {', '.join(attributes) if attributes else '无'}")
+        logger.info("--- 开始使用新条件重新筛选 ---")
+        logger.info(f"模组类型: {category}")
+        logger.info(f"优先属性: {', '.join(attributes) if attributes else '无'}")
         
-        category_map = {
-            "攻击": ModuleCategory.ATTACK, "守护": ModuleCategory.GUARDIAN,
-            "辅助": ModuleCategory.SUPPORT, "全部": ModuleCategory.All
-        }
-        target_category = category_map.get(category, ModuleCategory.All)
+        target_category = _CATEGORY_MAP.get(category, ModuleCategory.All)
         
         # 调用优化器，并传递进度回调函数
         self.module_optimizer.optimize_and_display(